@@ -4,71 +4,995 @@ Browser Agent using Azure OpenAI and Playwright with ReAct-style loop.
 This module implements a browser agent that uses Azure OpenAI's LLM to reason
 about browser interactions and execute actions using Playwright.
 """
+import atexit
 import datetime
+import hashlib
 import os
 import json
-from typing import Dict, List, Any, Optional
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Final, List, Any, Optional
+import httpx
 from openai import AzureOpenAI
-from playwright.sync_api import sync_playwright, Page, Browser
+from playwright.sync_api import sync_playwright, Browser, TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
 
+from semantic_cache import SemanticCache
 
-class BrowserAgent:
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts are estimated without it
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+# Single-pass ReAct parser: one alternative per line prefix, matched in order
+_REACT_RE = re.compile(
+    r'^[ \t]*(?:Thought:[ \t]*(?P<thought>.*?)$'
+    r'|Action:[ \t]*(?P<action>.*?)$'
+    r'|Action Input:[ \t]*(?P<input>\{.*?\}|)'
+    r'|Final Answer:[ \t]*(?P<final>.*))',
+    re.MULTILINE | re.DOTALL
+)
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _json_loads(data: str) -> Any:
+    """Decode JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any, sort_keys: bool = False) -> str:
+    """Encode JSON to a str with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None).decode()
+    return json.dumps(obj, sort_keys=sort_keys)
+
+
+def _selector_timeout(selector: str) -> Dict[str, Any]:
+    """Build the failed action result for an element that did not appear in time."""
+    return {
+        "success": False,
+        "error": f"selector not found within {ACTION_TIMEOUT_MS / 1000:g}s: {selector}"
+    }
+
+
+def _screenshot_path(base_name: str) -> str:
+    """Build a timestamped JPEG path in the screenshot folder."""
+    # Ensure screenshot folder exists
+    screenshot_dir = "playwright-screenshots"
+    os.makedirs(screenshot_dir, exist_ok=True)
+    # Generate timestamped filename
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    name, _ = os.path.splitext(base_name)
+    return os.path.join(screenshot_dir, f"{name}_{timestamp}.jpg")
+
+
+def _messages_key(messages: List[Dict[str, str]]) -> str:
+    """Hash request messages into an exact-match response cache key."""
+    return hashlib.blake2b(_json_dumps(messages).encode()).hexdigest()
+
+
+def _semantic_cache_text(messages: List[Dict[str, str]]) -> str:
+    """
+    Build the text embedded for the semantic cache: the task, the last
+    assistant message and the latest observation. The previous action keeps
+    two steps with the same observation apart. The system prompt is shared
+    by every request, so it is left out; it would only pull unrelated tasks
+    closer together.
+    """
+    task = messages[1]["content"] if len(messages) > 1 else messages[0]["content"]
+    turns = messages[2:]
+    action = next((m["content"] for m in reversed(turns) if m["role"] == "assistant"), "")
+    observation = next((m["content"] for m in reversed(turns) if m["role"] == "user"), "")
+    return "\n".join(part for part in (task, action, observation) if part)
+
+
+# Default Playwright timeout for page operations, in milliseconds
+DEFAULT_TIMEOUT_MS = 5000
+# Navigation timeout; set separately because the default timeout also caps
+# page.goto(), and 5s is too short for slow pages
+NAVIGATION_TIMEOUT_MS = 30000
+# Timeout for element actions (click, type, get_text); a missing element is
+# reported back quickly so the LLM can pick another selector
+ACTION_TIMEOUT_MS = 2000
+
+# A complete "Final Answer:" line in a streamed response
+_FINAL_LINE_RE = re.compile(r'^[ \t]*Final Answer:[^\n]*\n', re.MULTILINE)
+
+
+class ReactStreamScanner:
+    """
+    Accumulate a streamed ReAct response and detect when it is complete.
+    
+    A response is complete once the JSON object after "Action Input:" has
+    balanced braces (ignoring braces inside strings) or a "Final Answer:"
+    line has ended; anything the model would generate after that is unused,
+    and is cut from ``response`` even when it arrived in the same chunk.
+    """
+    
+    __slots__ = ("buffer", "_pos", "_depth", "_in_string", "_escape", "_end")
+    
+    def __init__(self):
+        self.buffer = ""
+        self._pos = None  # Next index to scan once "Action Input:" was seen
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._end = None  # End of the complete response within the buffer
+    
+    @property
+    def response(self) -> str:
+        """The streamed text up to the end of the action or final answer."""
+        return self.buffer if self._end is None else self.buffer[:self._end]
+    
+    def feed(self, text: str) -> bool:
+        """Append streamed text and return True once the response is complete."""
+        self.buffer += text
+        
+        if self._pos is None:
+            final = _FINAL_LINE_RE.search(self.buffer)
+            if final:
+                self._end = final.end() - 1  # Drop the line's newline too
+                return True
+            marker = self.buffer.find("Action Input:")
+            if marker < 0:
+                return False
+            self._pos = marker + len("Action Input:")
+        
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    self._pos = self._end = i + 1
+                    return True
+        self._pos = len(buffer)
+        return False
+
+
+# Maximum number of characters of page text returned by get_page_info()
+PAGE_TEXT_LIMIT = 1000
+_PAGE_TEXT_JS = f"() => document.body ? document.body.innerText.slice(0, {PAGE_TEXT_LIMIT}) : ''"
+
+# Screenshots are viewport-only JPEGs: much smaller and faster to encode than
+# full-page PNGs (Playwright cannot encode WebP)
+_SCREENSHOT_OPTIONS = {"type": "jpeg", "quality": 80, "full_page": False}
+
+# Maximum number of interactive elements returned by get_axtree()
+AXTREE_LIMIT = 100
+# Stamps a stable data-agent-ref on each visible interactive element (native
+# controls, interactive ARIA roles and focusable elements; structural roles
+# such as region or presentation are skipped) and returns compact
+# [ref, role, name] rows for them
+_AXTREE_JS = """(limit) => {
+  if (!document.body) return [];
+  const roles = ['button', 'link', 'textbox', 'searchbox', 'combobox', 'checkbox', 'radio',
+                 'switch', 'slider', 'spinbutton', 'tab', 'menuitem', 'menuitemcheckbox',
+                 'menuitemradio', 'option', 'treeitem'];
+  const interactive = 'a[href], button, input, select, textarea, summary, [contenteditable="true"], '
+    + '[onclick], [tabindex]:not([tabindex="-1"]), ' + roles.map(r => `[role="${r}"]`).join(', ');
+  const tagRoles = {A: 'link', BUTTON: 'button', SELECT: 'combobox', TEXTAREA: 'textbox', SUMMARY: 'button'};
+  const inputRoles = {checkbox: 'checkbox', radio: 'radio', submit: 'button', button: 'button',
+                      reset: 'button', range: 'slider', search: 'searchbox'};
+  window.__agentNextRef = window.__agentNextRef || 1;
+  const rows = [];
+  for (const el of document.querySelectorAll(interactive)) {
+    if (rows.length >= limit) break;
+    if (el.type === 'hidden' || !el.getClientRects().length) continue;
+    let ref = el.getAttribute('data-agent-ref');
+    if (!ref) {
+      ref = String(window.__agentNextRef++);
+      el.setAttribute('data-agent-ref', ref);
+    }
+    const role = el.getAttribute('role')
+      || (el.tagName === 'INPUT' ? inputRoles[el.type] || 'textbox' : tagRoles[el.tagName])
+      || el.tagName.toLowerCase();
+    const name = (el.getAttribute('aria-label') || el.innerText || el.value || el.placeholder
+      || el.title || el.alt || '').replace(/\\s+/g, ' ').trim().slice(0, 80);
+    rows.push([Number(ref), role, name]);
+  }
+  return rows;
+}"""
+
+
+# Shared keep-alive HTTP client for all AzureOpenAI clients, so back-to-back
+# completions reuse pooled connections instead of new TCP/TLS handshakes
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+
+def _get_http_client() -> httpx.Client:
+    """Return the shared HTTP client, creating it on first use."""
+    global _http_client
+    
+    with _http_client_lock:
+        if _http_client is None:
+            # Pool limits and HTTP/2 are transport options when a transport is given
+            limits = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+            try:
+                transport = httpx.HTTPTransport(http2=True, retries=2, limits=limits)
+            except ImportError:  # HTTP/2 needs the optional h2 package
+                transport = httpx.HTTPTransport(retries=2, limits=limits)
+            _http_client = httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return _http_client
+
+
+def _close_http_client():
+    """Close the shared HTTP client."""
+    global _http_client
+    
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+atexit.register(_close_http_client)
+
+
+# Shared Playwright driver and Chromium processes, reused across runs so only a
+# fresh BrowserContext is created per task. Keyed by the headless flag.
+# The sync Playwright API is bound to the thread that started it, so the shared
+# browser may only be used from that thread; run tasks concurrently with
+# browser_agent_async.run_batch() instead of threads.
+_playwright = None
+_playwright_thread: Optional[int] = None
+_browsers: Dict[bool, Browser] = {}
+_browser_lock = threading.Lock()
+
+
+def _get_browser(headless: bool = False) -> Browser:
+    """
+    Return the shared Chromium browser, launching it on first use.
+    
+    Raises:
+        RuntimeError: If called from a thread other than the one that started
+            the shared Playwright driver
+    """
+    global _playwright, _playwright_thread
+    
+    with _browser_lock:
+        if _playwright is None:
+            _playwright = sync_playwright().start()
+            _playwright_thread = threading.get_ident()
+        elif _playwright_thread != threading.get_ident():
+            raise RuntimeError(
+                "The shared browser can only be used from the thread that started it; "
+                "use browser_agent_async.run_batch() to run tasks concurrently"
+            )
+        
+        browser = _browsers.get(headless)
+        if browser is None or not browser.is_connected():
+            browser = _playwright.chromium.launch(headless=headless)
+            _browsers[headless] = browser
+        return browser
+
+
+def _close_browsers():
+    """Close the shared browsers and stop the Playwright driver."""
+    global _playwright, _playwright_thread
+    
+    with _browser_lock:
+        for browser in _browsers.values():
+            try:
+                browser.close()
+            except Exception:
+                pass
+        _browsers.clear()
+        if _playwright is not None:
+            # The driver may already be gone at interpreter exit
+            try:
+                _playwright.stop()
+            except Exception:
+                pass
+            _playwright = None
+            _playwright_thread = None
+
+
+atexit.register(_close_browsers)
+
+
+# The system prompt is fully static and always sent as the first message, so
+# Azure OpenAI can serve it from its prompt cache on every iteration. The
+# canonical examples at the end keep it above the 1024-token minimum required
+# for caching; do not interpolate anything into it.
+_SYSTEM_PROMPT: Final[str] = """You are a browser automation agent. You can interact with web pages using the following actions:
+
+1. navigate - Navigate to a URL
+   Action Input: {"url": "https://example.com"}
+
+2. click - Click on an element
+   Action Input: {"selector": "button#submit"}
+
+3. type - Type text into an element
+   Action Input: {"selector": "input#search", "text": "search query"}
+
+4. get_text - Get text from an element
+   Action Input: {"selector": "h1"}
+
+5. screenshot - Take a screenshot, saved to a file when a path is given
+   Action Input: {"path": "screenshot.jpg"}
+   Without a path, use {} and the screenshot is kept in memory; the result is its id.
+
+6. snapshot - List the page's URL, title, text and interactive elements
+   Action Input: {}
+
+7. batch - Run several independent actions in one step, in order
+   Action Input: {"actions": [{"name": "get_text", "params": {"selector": "h1"}}, {"name": "get_text", "params": {"selector": "p"}}]}
+
+Each element in a snapshot has a numeric ref. click, type and get_text accept {"ref": 3} in place of a selector to target that element:
+   Action Input: {"ref": 3, "text": "search query"}
+
+Use the ReAct format to reason and act:
+
+Thought: [Your reasoning about what to do next]
+Action: [The action to take: navigate, click, type, get_text, screenshot, snapshot, or batch]
+Action Input: [JSON parameters for the action]
+
+After receiving the observation, continue reasoning. When you've completed the task, use:
+
+Final Answer: [Summary of what was accomplished]
+
+Always reason step by step and explain your actions.
+
+Rules:
+- Emit exactly one Thought, one Action and one Action Input per response, then stop and wait for the Observation.
+- Action Input must be a single valid JSON object on one line, using double quotes for keys and strings.
+- Only use the seven actions listed above. Do not invent new action names.
+- Use batch when you already know several actions that do not depend on each other's results, such as reading multiple elements. Batch actions cannot be nested.
+- Prefer short, specific CSS selectors (ids, names, data attributes) over long positional chains. When you are unsure which selector to use, take a snapshot and use an element's ref.
+- Always navigate to a page before trying to click, type or read text on it.
+- If an Observation reports "success": false, read the error, adjust the selector or action, and try again instead of repeating the same step.
+- Never fabricate page content. Only report text that was returned in an Observation.
+- Use Final Answer as soon as the task is complete, and include any text the task asked you to retrieve.
+
+Canonical examples:
+
+Example 1 - reading a heading
+Task: Navigate to https://www.example.com and get the main heading text
+
+Thought: I need to open the page first.
+Action: navigate
+Action Input: {"url": "https://www.example.com"}
+
+Observation: {"success": true, "result": "Navigated to https://www.example.com"}
+
+Thought: The page is loaded, so I can read the main heading.
+Action: get_text
+Action Input: {"selector": "h1"}
+
+Observation: {"success": true, "result": "Example Domain"}
+
+Final Answer: The main heading text is "Example Domain".
+
+Example 2 - searching a site
+Task: Search https://duckduckgo.com for "playwright python"
+
+Thought: I will open the search engine home page.
+Action: navigate
+Action Input: {"url": "https://duckduckgo.com"}
+
+Observation: {"success": true, "result": "Navigated to https://duckduckgo.com"}
+
+Thought: I need to type the query into the search box.
+Action: type
+Action Input: {"selector": "input[name='q']", "text": "playwright python"}
+
+Observation: {"success": true, "result": "Typed 'playwright python' into input[name='q']"}
+
+Thought: Now I submit the search by clicking the search button.
+Action: click
+Action Input: {"selector": "button[type='submit']"}
+
+Observation: {"success": true, "result": "Clicked on button[type='submit']"}
+
+Final Answer: Searched DuckDuckGo for "playwright python".
+
+Example 3 - recovering from an error
+Task: Get the text of the first paragraph on https://www.example.com
+
+Thought: I need to open the page first.
+Action: navigate
+Action Input: {"url": "https://www.example.com"}
+
+Observation: {"success": true, "result": "Navigated to https://www.example.com"}
+
+Thought: I will read the first paragraph using a class selector.
+Action: get_text
+Action Input: {"selector": "p.intro"}
+
+Observation: {"success": false, "error": "selector not found within 2s: p.intro"}
+
+Thought: That selector does not exist on this page. A plain tag selector is more robust here.
+Action: get_text
+Action Input: {"selector": "p"}
+
+Observation: {"success": true, "result": "This domain is for use in illustrative examples in documents."}
+
+Final Answer: The first paragraph reads "This domain is for use in illustrative examples in documents."
+
+Example 4 - capturing the page
+Task: Navigate to https://www.example.com and take a screenshot
+
+Thought: I need to open the page before taking a screenshot.
+Action: navigate
+Action Input: {"url": "https://www.example.com"}
+
+Observation: {"success": true, "result": "Navigated to https://www.example.com"}
+
+Thought: The page is loaded, so I can capture it now.
+Action: screenshot
+Action Input: {"path": "example.jpg"}
+
+Observation: {"success": true, "result": "Screenshot saved to playwright-screenshots/example_20250101_120000.jpg"}
+
+Final Answer: Navigated to https://www.example.com and saved a screenshot.
+
+Example 5 - reading several elements at once
+Task: Get the heading and the first paragraph of https://www.example.com
+
+Thought: I need to open the page first.
+Action: navigate
+Action Input: {"url": "https://www.example.com"}
+
+Observation: {"success": true, "result": "Navigated to https://www.example.com"}
+
+Thought: The heading and paragraph are independent reads, so I can batch them.
+Action: batch
+Action Input: {"actions": [{"name": "get_text", "params": {"selector": "h1"}}, {"name": "get_text", "params": {"selector": "p"}}]}
+
+Observation: {"success": true, "results": [{"success": true, "result": "Example Domain"}, {"success": true, "result": "This domain is for use in illustrative examples in documents."}]}
+
+Final Answer: The heading is "Example Domain" and the first paragraph begins "This domain is for use in illustrative examples".
+
+Example 6 - using element refs
+Task: Open the "More information" link on https://www.example.com
+
+Thought: I need to open the page first.
+Action: navigate
+Action Input: {"url": "https://www.example.com"}
+
+Observation: {"success": true, "result": "Navigated to https://www.example.com"}
+
+Thought: I do not know the link's selector, so I will list the interactive elements.
+Action: snapshot
+Action Input: {}
+
+Observation: {"success": true, "result": {"url": "https://www.example.com/", "title": "Example Domain", "content": "Example Domain ...", "elements": [{"ref": 1, "role": "link", "name": "More information..."}]}}
+
+Thought: The link has ref 1, so I can click it directly.
+Action: click
+Action Input: {"ref": 1}
+
+Observation: {"success": true, "result": "Clicked on [data-agent-ref=\\"1\\"]"}
+
+Final Answer: Opened the "More information" link on https://www.example.com.
+"""
+
+# Consecutive iterations without progress (repeated or invalid actions)
+# after which run() gives up early
+MAX_STALLED_ITERATIONS = 3
+_REPEATED_ACTION_OBSERVATION = "Observation: identical action repeated; try a different selector or action."
+# Result recorded in the history for a repeated action that was not executed
+_REPEATED_ACTION_RESULT = {"success": False, "error": "repeated action skipped"}
+
+# Model context window, in tokens, used to budget max_tokens per completion
+CONTEXT_WINDOW = 128000
+# Upper bound for the completion length of one ReAct step
+MAX_RESPONSE_TOKENS = 500
+# Maximum number of responses kept in an agent's exact-match cache; the least
+# recently used one is evicted first
+EXACT_CACHE_SIZE = 256
+
+
+def _count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, else estimate ~4 chars/token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // 4 + 1
+
+
+try:
+    _ENCODING = tiktoken.encoding_for_model("gpt-4o") if tiktoken is not None else None
+except Exception:  # The encoding is downloaded on first use and may be unavailable offline
+    _ENCODING = None
+
+_SYSTEM_PROMPT_TOKENS: Final[int] = _count_tokens(_SYSTEM_PROMPT)
+
+
+class ReactAgentBase:
+    """
+    The parts of the ReAct loop that do not touch the LLM client or the browser.
+    
+    BrowserAgent and AsyncBrowserAgent share prompting, response parsing,
+    action validation, message windowing and per-step bookkeeping through this
+    class; each provides its own client, browser actions and run loop.
+    """
+    
+    # Fixed attribute layout: no per-instance __dict__ and faster attribute
+    # access on the hot paths in run() and execute_action()
+    __slots__ = (
+        "client", "deployment", "browser", "page", "max_iterations", "history", "window",
+        "_cache", "_exact_cache", "_screenshots", "_cache_totals", "_previous_key",
+        "_stalled", "_log_prefix"
+    )
+    
+    # Action name -> (handler, parameters that must be present and non-empty);
+    # filled in by subclasses
+    _HANDLERS: Dict[str, Any] = {}
+    
+    def __init__(self, client: Any, cache: Optional[SemanticCache] = None):
+        """
+        Initialize the state shared by the sync and async agents.
+        
+        Args:
+            client: The (sync or async) Azure OpenAI client
+            cache: Optional semantic response cache
+        """
+        self.client = client
+        self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        
+        # Response caches: exact-match on the request messages (sampling is
+        # deterministic), then semantic (None unless an embedding deployment
+        # is configured)
+        self._exact_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache = cache
+        
+        # Playwright browser and this agent's page (sync or async API)
+        self.browser: Optional[Any] = None
+        self.page: Optional[Any] = None
+        # In-memory screenshots of the current run, keyed by content hash
+        self._screenshots: Dict[str, bytes] = {}
+        
+        # ReAct loop configuration
+        self.max_iterations = 10
+        self.history: List[Dict[str, Any]] = []
+        # Number of most recent assistant/observation messages resent verbatim;
+        # keep it even so the window always starts on an assistant turn.
+        self.window = 4
+        
+        # Per-run state, reset by start_run()
+        self._cache_totals = {"prompt_tokens": 0, "cached_tokens": 0, "samples": 0}
+        self._previous_key: Optional[tuple] = None
+        self._stalled = 0
+        self._log_prefix = ""
+    
+    def resolve_ref(self, params: Any) -> Any:
+        """Turn a ``ref`` from get_axtree() into the matching ``selector``."""
+        if isinstance(params, dict) and "ref" in params and not params.get("selector"):
+            return {**params, "selector": f'[data-agent-ref="{params["ref"]}"]'}
+        return params
+    
+    def check_action(self, action: str, params: Any) -> Optional[str]:
+        """
+        Validate an action and its parameters before touching the page.
+        
+        Returns:
+            str: An error message, or None if the action can be executed
+        """
+        if action not in self._HANDLERS:
+            return f"Unknown action: {action}"
+        if not isinstance(params, dict):
+            return f"Action Input for {action} must be a JSON object"
+        
+        _, required = self._HANDLERS[action]
+        missing = sorted(key for key in required if not params.get(key))
+        if missing:
+            return f"Missing required parameter(s) for {action}: {', '.join(missing)}"
+        return None
+    
+    def store_screenshot(self, data: bytes) -> Dict[str, Any]:
+        """
+        Keep an in-memory screenshot, keyed by its hash.
+        
+        Identical screens are stored once, and only the hash is returned so the
+        LLM can refer to the image without it being sent back.
+        """
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self._screenshots.setdefault(digest, data)
+        return {"success": True, "result": digest}
+    
+    def get_screenshot(self, digest: str) -> Optional[bytes]:
+        """Return the in-memory screenshot with the given hash, if any."""
+        return self._screenshots.get(digest)
+    
+    def parse_llm_response(self, response: str) -> tuple[str, str, Dict[str, Any]]:
+        """
+        Parse LLM response in ReAct format.
+        
+        Expected format:
+        Thought: <reasoning>
+        Action: <action_name>
+        Action Input: <json_params>
+        
+        Returns:
+            tuple: (thought, action, params)
+        """
+        thought = ""
+        action = ""
+        params = {}
+        
+        for match in _REACT_RE.finditer(response):
+            if match.group("thought") is not None:
+                thought = match.group("thought").strip()
+            elif match.group("action") is not None:
+                action = match.group("action").strip()
+            elif match.group("input") is not None:
+                try:
+                    params = _json_loads(match.group("input"))
+                except json.JSONDecodeError:
+                    # The lazy match stops at the first closing brace, and the
+                    # group is empty when the object starts on a later line
+                    # (or inside a ```json fence); decode the full object from
+                    # the first opening brace after the marker instead
+                    brace = response.find("{", match.start("input"))
+                    params = {}
+                    if brace >= 0:
+                        try:
+                            params, _ = _JSON_DECODER.raw_decode(response, brace)
+                        except json.JSONDecodeError:
+                            pass
+            else:
+                # Task is complete
+                action = "FINISH"
+                thought = match.group("final").strip()
+                break
+        
+        return thought, action, params
+    
+    def create_system_prompt(self) -> str:
+        """Create the system prompt for the LLM."""
+        return _SYSTEM_PROMPT
+    
+    def log_cache_usage(self, usage: Any, totals: Dict[str, int]) -> None:
+        """
+        Log how many prompt tokens were served from Azure OpenAI's prompt cache.
+
+        Args:
+            usage: The ``usage`` object of a chat completion response
+            totals: Running ``prompt_tokens``/``cached_tokens`` counts for the run
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        if not isinstance(prompt_tokens, int) or not isinstance(cached_tokens, int):
+            return
+        
+        totals["prompt_tokens"] += prompt_tokens
+        totals["cached_tokens"] += cached_tokens
+        hit_rate = totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0
+        logger.info("Prompt cache: %d/%d tokens cached (run hit rate: %.0f%%)",
+                    cached_tokens, prompt_tokens, hit_rate * 100)
+    
+    def summarize_step(self, step: Dict[str, Any]) -> str:
+        """Condense a history step into its observation result, dropping the thought."""
+        result = step.get("result")
+        if result is None:
+            return "no valid action"
+        if "results" in result:
+            # Batch actions report one result per sub-action
+            text = "; ".join(self.summarize_step({"result": r}) for r in result["results"])
+        elif result.get("success"):
+            text = str(result.get("result", ""))
+        else:
+            text = f"error: {result.get('error', '')}"
+        return text[:200]
+    
+    def build_request_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Build the message list sent to the LLM for the next iteration.
+        
+        The static prefix (system prompt and task) is always kept, followed by
+        the last ``self.window`` assistant/observation messages. Older turns are
+        collapsed into a single summary message built from ``self.history``.
+        
+        Args:
+            messages: The full conversation so far
+            
+        Returns:
+            list: The messages to send to the LLM
+        """
+        prefix, turns = messages[:2], messages[2:]
+        if len(turns) <= self.window:
+            return messages
+        
+        dropped_steps = self.history[:(len(turns) - self.window) // 2]
+        summary = "\n".join(
+            f"{i}. {self.summarize_step(step)}" for i, step in enumerate(dropped_steps, 1)
+        )
+        return prefix + [
+            {"role": "user", "content": f"Prior steps summary:\n{summary}"}
+        ] + turns[-self.window:]
+    
+    def budget_max_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """
+        Cap the completion length so the request fits in the context window.
+        
+        The system prompt's token count is computed once at import; only the
+        remaining messages are counted per call.
+        """
+        used = _SYSTEM_PROMPT_TOKENS + sum(_count_tokens(m["content"]) for m in messages[1:])
+        return max(1, min(MAX_RESPONSE_TOKENS, CONTEXT_WINDOW - used - 50))
+    
+    def exact_cache_get(self, key: str) -> Optional[str]:
+        """Return the exact-match cached response for ``key``, if any."""
+        response = self._exact_cache.get(key)
+        if response is not None:
+            self._exact_cache.move_to_end(key)
+        return response
+    
+    def exact_cache_put(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used beyond EXACT_CACHE_SIZE."""
+        self._exact_cache[key] = response
+        self._exact_cache.move_to_end(key)
+        if len(self._exact_cache) > EXACT_CACHE_SIZE:
+            self._exact_cache.popitem(last=False)
+    
+    def start_run(self, task: str, log_prefix: str = "") -> List[Dict[str, str]]:
+        """
+        Reset the per-run state and return the initial messages for a task.
+        
+        Args:
+            task: The task description for the agent
+            log_prefix: Prepended to this run's log lines
+            
+        Returns:
+            list: The system prompt and task messages
+        """
+        self.history = []
+        # Screenshots are only kept until the next run, so memory does not
+        # grow with the number of runs
+        self._screenshots = {}
+        self._cache_totals = {"prompt_tokens": 0, "cached_tokens": 0, "samples": 0}
+        self._previous_key = None
+        self._stalled = 0
+        self._log_prefix = log_prefix
+        
+        # messages[0] (system) and messages[1] (task) form the cacheable
+        # prefix: they must stay byte-identical, so history is only ever
+        # appended, never edited in place.
+        return [
+            {"role": "system", "content": self.create_system_prompt()},
+            {"role": "user", "content": f"Task: {task}"}
+        ]
+    
+    def plan_step(self, messages: List[Dict[str, str]],
+                  assistant_message: str) -> tuple[Dict[str, Any], bool]:
+        """
+        Record an assistant message and decide what to do with its action.
+        
+        Final answers, repeated actions and responses without a valid action
+        are fully handled here. Otherwise the caller executes the step's action
+        and passes the result to record_result().
+        
+        Args:
+            messages: The full conversation so far; updated in place
+            assistant_message: The LLM response for this iteration
+            
+        Returns:
+            tuple: (step, whether the step's action must be executed)
+        """
+        messages.append({"role": "assistant", "content": assistant_message})
+        
+        thought, action, params = self.parse_llm_response(assistant_message)
+        step = {"thought": thought, "action": action, "params": params, "result": None}
+        self.history.append(step)
+        if action == "FINISH":
+            return step, False
+        
+        key = (action, _json_dumps(params, sort_keys=True)) if action else None
+        repeated = key is not None and key == self._previous_key
+        self._previous_key = key
+        
+        if repeated:
+            # The LLM repeated itself; coach it instead of redoing the action
+            logger.info("%sSkipping repeated action: %s", self._log_prefix, action)
+            self._stalled += 1
+            step["result"] = dict(_REPEATED_ACTION_RESULT)
+            messages.append({"role": "user", "content": _REPEATED_ACTION_OBSERVATION})
+            return step, False
+        if not action:
+            # No valid action found, ask for clarification
+            self._stalled += 1
+            messages.append({
+                "role": "user",
+                "content": "Please provide a valid action in the specified format."
+            })
+            return step, False
+        
+        self._stalled = 0
+        return step, True
+    
+    def record_result(self, messages: List[Dict[str, str]], step: Dict[str, Any],
+                      result: Dict[str, Any]) -> None:
+        """Store an executed action's result and add it as an observation."""
+        logger.info("%sResult: %s\n", self._log_prefix, result)
+        step["result"] = result
+        messages.append({"role": "user", "content": "Observation: " + _json_dumps(result)})
+    
+    def step_outcome(self, step: Dict[str, Any]) -> Optional[str]:
+        """
+        Return the run's final message if the run ends after ``step``.
+        
+        A run ends on a final answer, or early once MAX_STALLED_ITERATIONS
+        consecutive iterations made no progress.
+        """
+        if step["action"] == "FINISH":
+            logger.info("%sTask completed: %s", self._log_prefix, step["thought"])
+            return step["thought"]
+        if self._stalled >= MAX_STALLED_ITERATIONS:
+            logger.info("%sStopping: no progress in %d iterations", self._log_prefix, self._stalled)
+            return f"Stopped after {self._stalled} consecutive iterations without progress."
+        return None
+
+
+class BrowserAgent(ReactAgentBase):
     """
     A browser agent that uses Azure OpenAI LLM with ReAct-style reasoning
     to interact with web pages using Playwright.
     """
     
+    __slots__ = ("playwright",)
+    
     def __init__(self):
         """Initialize the browser agent with Azure OpenAI and Playwright."""
         load_dotenv()
         
         # Initialize Azure OpenAI client
-        self.client = AzureOpenAI(
+        client = AzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-01-preview"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            http_client=_get_http_client()
         )
-        self.deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        super().__init__(client, SemanticCache.from_env(client))
         
-        # Playwright components
+        # Playwright driver of the shared browser, set by start_browser()
         self.playwright = None
-        self.browser: Optional[Browser] = None
-        self.page: Optional[Page] = None
-        
-        # ReAct loop configuration
-        self.max_iterations = 10
-        self.history: List[Dict[str, str]] = []
         
     def start_browser(self, headless: bool = False):
-        """Start the Playwright browser."""
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=headless)
-        self.page = self.browser.new_page()
+        """Open a fresh browser context and page on the shared browser."""
+        self.browser = _get_browser(headless=headless)
+        self.playwright = _playwright
+        context = self.browser.new_context()
+        self.page = context.new_page()
+        self.page.set_default_timeout(DEFAULT_TIMEOUT_MS)
+        self.page.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
         
     def stop_browser(self):
-        """Stop the Playwright browser."""
+        """Close this agent's browser context; the shared browser stays running."""
         if self.page:
-            self.page.close()
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+            self.page.context.close()
+            self.page = None
             
+    def get_axtree(self) -> List[Dict[str, Any]]:
+        """
+        Get a compact snapshot of the page's visible interactive elements.
+        
+        Each element is stamped with a ``data-agent-ref`` attribute so the LLM
+        can target it with ``{"ref": <ref>}`` instead of writing a selector.
+        
+        Returns:
+            list: ``{"ref", "role", "name"}`` dicts in document order
+        """
+        rows = self.page.evaluate(_AXTREE_JS, AXTREE_LIMIT)
+        return [{"ref": ref, "role": role, "name": name} for ref, role, name in rows]
+    
     def get_page_info(self) -> Dict[str, Any]:
         """Get current page information."""
         if not self.page:
             return {"error": "Browser not started"}
         
         try:
-            return {
+            info = {
                 "url": self.page.url,
                 "title": self.page.title(),
-                "content": self.page.content()[:1000]  # Limit content size
+                # Truncate inside the browser so the full HTML is never transferred
+                "content": self.page.evaluate(_PAGE_TEXT_JS),
+                "elements": self.get_axtree()
             }
+            main = self.page.locator("main")
+            if main.count():
+                try:
+                    info["main_text"] = main.first.inner_text(timeout=500)[:PAGE_TEXT_LIMIT]
+                except Exception:
+                    pass
+            return info
         except Exception as e:
             return {"error": str(e)}
     
+    def _do_navigate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        url = params["url"]
+        self.page.goto(url)
+        return {"success": True, "result": f"Navigated to {url}"}
+    
+    def _do_click(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        try:
+            self.page.click(selector, timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": f"Clicked on {selector}"}
+    
+    def _do_type(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        text = params.get("text", "")
+        try:
+            self.page.fill(selector, text, timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": f"Typed '{text}' into {selector}"}
+    
+    def _do_get_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        try:
+            text = self.page.locator(selector).first.text_content(timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": text}
+    
+    def _do_screenshot(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not params.get("path"):
+            return self.store_screenshot(self.page.screenshot(**_SCREENSHOT_OPTIONS))
+        
+        path = _screenshot_path(params["path"])
+        self.page.screenshot(path=path, **_SCREENSHOT_OPTIONS)
+        return {"success": True, "result": f"Screenshot saved to {path}"}
+    
+    def _do_snapshot(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        info = self.get_page_info()
+        if "error" in info:
+            return {"success": False, "error": info["error"]}
+        return {"success": True, "result": info}
+    
+    def _do_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        results = []
+        for item in params["actions"]:
+            if not isinstance(item, dict):
+                results.append({"success": False, "error": "Batch items must be JSON objects"})
+            elif item.get("name") == "batch":
+                results.append({"success": False, "error": "Batch actions cannot be nested"})
+            else:
+                results.append(self.execute_action(item.get("name", ""), item.get("params", {})))
+        return {"success": all(r["success"] for r in results), "results": results}
+    
+    # Action name -> (handler, parameters that must be present and non-empty)
+    _HANDLERS = {
+        "navigate": (_do_navigate, {"url"}),
+        "click": (_do_click, {"selector"}),
+        "type": (_do_type, {"selector"}),
+        "get_text": (_do_get_text, {"selector"}),
+        "screenshot": (_do_screenshot, set()),
+        "snapshot": (_do_snapshot, set()),
+        "batch": (_do_batch, {"actions"}),
+    }
+    
     def execute_action(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute a browser action.
@@ -79,134 +1003,101 @@ class BrowserAgent:
         - type: Type text into an element
         - get_text: Get text from an element
         - screenshot: Take a screenshot
+        - snapshot: Get the page URL, title, text and interactive elements
+        - batch: Run several actions in order and return all their results
+        
+        Element actions accept either a CSS ``selector`` or a ``ref`` from the
+        snapshot. Malformed actions are rejected before Playwright is called, so they fail
+        immediately instead of waiting for a selector timeout.
         """
         if not self.page:
             return {"success": False, "error": "Browser not started"}
         
+        params = self.resolve_ref(params)
+        error = self.check_action(action, params)
+        if error:
+            return {"success": False, "error": error}
+        
+        handler, _ = self._HANDLERS[action]
         try:
-            if action == "navigate":
-                url = params.get("url", "")
-                self.page.goto(url)
-                return {"success": True, "result": f"Navigated to {url}"}
-            
-            elif action == "click":
-                selector = params.get("selector", "")
-                self.page.click(selector)
-                return {"success": True, "result": f"Clicked on {selector}"}
-            
-            elif action == "type":
-                selector = params.get("selector", "")
-                text = params.get("text", "")
-                self.page.fill(selector, text)
-                return {"success": True, "result": f"Typed '{text}' into {selector}"}
-            
-            elif action == "get_text":
-                selector = params.get("selector", "")
-                text = self.page.text_content(selector)
-                return {"success": True, "result": text}
-            
-            elif action == "screenshot":
-                # Ensure screenshot folder exists
-                screenshot_dir = "playwright-screenshots"
-                os.makedirs(screenshot_dir, exist_ok=True)
-                # Generate timestamped filename
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                base_name = params.get("path", "screenshot.png")
-                name, ext = os.path.splitext(base_name)
-                filename = f"{name}_{timestamp}{ext}"
-                path = os.path.join(screenshot_dir, filename)
-                self.page.screenshot(path=path)
-                return {"success": True, "result": f"Screenshot saved to {path}"}
-            
-            else:
-                return {"success": False, "error": f"Unknown action: {action}"}
-                
+            return handler(self, params)
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def parse_llm_response(self, response: str) -> tuple[str, str, Dict[str, Any]]:
+    def get_llm_response(self, messages: List[Dict[str, str]], cache_totals: Dict[str, int]) -> str:
         """
-        Parse LLM response in ReAct format.
+        Get the assistant message for the given request messages.
         
-        Expected format:
-        Thought: <reasoning>
-        Action: <action_name>
-        Action Input: <json_params>
+        Sampling is deterministic, so an identical request is answered from the
+        exact-match cache. When the semantic cache is enabled, the task, the last
+        action and the latest observation are embedded and a sufficiently similar cached response is
+        returned without calling the LLM. Otherwise the completion is streamed
+        and closed as soon as a full action or final answer has arrived (the
+        first completion of a run is read to the end for its usage); the
+        result is stored in both caches.
         
+        Args:
+            messages: The messages to send to the LLM
+            cache_totals: Running prompt cache counts and completions streamed for the run
+            
         Returns:
-            tuple: (thought, action, params)
+            str: The assistant message
         """
-        thought = ""
-        action = ""
-        params = {}
+        key = _messages_key(messages)
+        cached = self.exact_cache_get(key)
+        if cached is not None:
+            logger.info("Exact cache hit")
+            return cached
         
-        lines = response.strip().split('\n')
-        i = 0
+        vector = None
+        if self._cache is not None:
+            # The semantic cache is only an optimization; on any failure
+            # (embedding call, index search) fall through to the LLM
+            try:
+                vector = self._cache.embed(_semantic_cache_text(messages))
+                cached = self._cache.lookup(vector)
+            except Exception as e:
+                logger.warning("Semantic cache lookup failed: %s", e)
+                vector = cached = None
+            if cached is not None:
+                logger.info("Semantic cache hit")
+                return cached
         
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            if line.startswith("Thought:"):
-                thought = line.replace("Thought:", "").strip()
-            elif line.startswith("Action:"):
-                action = line.replace("Action:", "").strip()
-            elif line.startswith("Action Input:"):
-                # Parse JSON from remaining lines
-                json_str = line.replace("Action Input:", "").strip()
-                i += 1
-                while i < len(lines) and not lines[i].strip().startswith(("Thought:", "Action:", "Final Answer:")):
-                    json_str += "\n" + lines[i].strip()
-                    i += 1
-                i -= 1  # Step back one line
-                
-                try:
-                    params = json.loads(json_str)
-                except json.JSONDecodeError:
-                    # Try to extract JSON object
-                    if "{" in json_str and "}" in json_str:
-                        json_start = json_str.index("{")
-                        json_end = json_str.rindex("}") + 1
-                        params = json.loads(json_str[json_start:json_end])
-            elif line.startswith("Final Answer:"):
-                # Task is complete
-                action = "FINISH"
-                thought = line.replace("Final Answer:", "").strip()
-                break
-            
-            i += 1
+        # Stream the completion and stop reading as soon as the action is complete
+        stream = self.client.chat.completions.create(
+            model=self.deployment,
+            messages=messages,
+            temperature=0.0,
+            seed=42,
+            max_tokens=self.budget_max_tokens(messages),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        # Usage arrives in a final chunk, so the first completion of each run
+        # is read to the end to sample the prompt cache hit rate
+        sample_usage = not cache_totals["samples"]
+        cache_totals["samples"] += 1
+        scanner = ReactStreamScanner()
+        complete = False
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    self.log_cache_usage(chunk.usage, cache_totals)
+                if not complete and chunk.choices and chunk.choices[0].delta.content:
+                    complete = scanner.feed(chunk.choices[0].delta.content)
+                if complete and not sample_usage:
+                    break
+        finally:
+            stream.close()
         
-        return thought, action, params
-    
-    def create_system_prompt(self) -> str:
-        """Create the system prompt for the LLM."""
-        return """You are a browser automation agent. You can interact with web pages using the following actions:
-
-1. navigate - Navigate to a URL
-   Action Input: {"url": "https://example.com"}
-
-2. click - Click on an element
-   Action Input: {"selector": "button#submit"}
-
-3. type - Type text into an element
-   Action Input: {"selector": "input#search", "text": "search query"}
-
-4. get_text - Get text from an element
-   Action Input: {"selector": "h1"}
-
-5. screenshot - Take a screenshot
-   Action Input: {"path": "screenshot.png"}
-
-Use the ReAct format to reason and act:
-
-Thought: [Your reasoning about what to do next]
-Action: [The action to take: navigate, click, type, get_text, or screenshot]
-Action Input: [JSON parameters for the action]
-
-After receiving the observation, continue reasoning. When you've completed the task, use:
-
-Final Answer: [Summary of what was accomplished]
-
-Always reason step by step and explain your actions."""
+        assistant_message = scanner.response
+        self.exact_cache_put(key, assistant_message)
+        if vector is not None:
+            try:
+                self._cache.add(vector, assistant_message)
+            except Exception as e:
+                logger.warning("Semantic cache store failed: %s", e)
+        return assistant_message
     
     def run(self, task: str, headless: bool = False) -> str:
         """
@@ -221,60 +1112,42 @@ Always reason step by step and explain your actions."""
         """
         try:
             self.start_browser(headless=headless)
-            
-            messages = [
-                {"role": "system", "content": self.create_system_prompt()},
-                {"role": "user", "content": f"Task: {task}"}
-            ]
+            messages = self.start_run(task)
             
             for iteration in range(self.max_iterations):
-                print(f"\n--- Iteration {iteration + 1} ---")
+                logger.info("\n--- Iteration %d ---", iteration + 1)
                 
                 # Get LLM response
-                response = self.client.chat.completions.create(
-                    model=self.deployment,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500
+                assistant_message = self.get_llm_response(
+                    self.build_request_messages(messages), self._cache_totals
                 )
+                logger.debug("LLM Response:\n%s\n", assistant_message)
                 
-                assistant_message = response.choices[0].message.content
-                print(f"LLM Response:\n{assistant_message}\n")
+                step, execute = self.plan_step(messages, assistant_message)
+                if execute:
+                    logger.info("Executing action: %s with params: %s", step["action"], step["params"])
+                    result = self.execute_action(step["action"], step["params"])
+                    self.record_result(messages, step, result)
                 
-                messages.append({"role": "assistant", "content": assistant_message})
-                
-                # Parse response
-                thought, action, params = self.parse_llm_response(assistant_message)
-                
-                # Check if finished
-                if action == "FINISH":
-                    print(f"Task completed: {thought}")
-                    return thought
-                
-                # Execute action
-                if action:
-                    print(f"Executing action: {action} with params: {params}")
-                    result = self.execute_action(action, params)
-                    print(f"Result: {result}\n")
-                    
-                    # Add observation to messages
-                    observation = f"Observation: {json.dumps(result)}"
-                    messages.append({"role": "user", "content": observation})
-                else:
-                    # No valid action found, ask for clarification
-                    messages.append({
-                        "role": "user",
-                        "content": "Please provide a valid action in the specified format."
-                    })
+                answer = self.step_outcome(step)
+                if answer is not None:
+                    return answer
             
             return "Maximum iterations reached without completion."
             
         finally:
             self.stop_browser()
+            if self._cache is not None:
+                try:
+                    self._cache.flush()
+                except Exception as e:
+                    logger.warning("Semantic cache save failed: %s", e)
 
 
 def main():
     """Example usage of the browser agent."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Example task
     task = "Navigate to https://www.example.com and get the main heading text"
     
@@ -0,0 +1,332 @@
+"""
+Async Browser Agent using Azure OpenAI and Playwright.
+
+This module provides an asyncio version of the BrowserAgent so several tasks
+can run concurrently on one event loop, overlapping LLM round-trips and page
+loads instead of running them one after another.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Any, Optional
+import httpx
+from openai import AsyncAzureOpenAI
+from playwright.async_api import async_playwright, Browser, TimeoutError as PlaywrightTimeoutError
+from dotenv import load_dotenv
+
+from browser_agent import (
+    ReactAgentBase, ReactStreamScanner, ACTION_TIMEOUT_MS, AXTREE_LIMIT, DEFAULT_TIMEOUT_MS,
+    NAVIGATION_TIMEOUT_MS, PAGE_TEXT_LIMIT, _AXTREE_JS, _PAGE_TEXT_JS, _SCREENSHOT_OPTIONS,
+    _messages_key, _screenshot_path, _selector_timeout
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of agent pages open at the same time in run_batch()
+MAX_PARALLEL_PAGES = 3
+
+
+class AsyncBrowserAgent(ReactAgentBase):
+    """
+    An asyncio browser agent with the same ReAct loop as BrowserAgent.
+
+    Prompting, response parsing, message windowing and step bookkeeping are
+    shared with BrowserAgent through ReactAgentBase; the LLM client, browser
+    actions and run loop are async.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize the agent with an async Azure OpenAI client.
+
+        Args:
+            http_client: Optional HTTP client to share connections between agents
+        """
+        load_dotenv()
+
+        # Initialize Azure OpenAI client. The semantic cache embeds prompts
+        # with a sync client, so it is not used by the async agent.
+        super().__init__(AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-01-preview"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            http_client=http_client
+        ))
+
+    async def start_browser(self, browser: Browser):
+        """Open a fresh browser context and page on the given browser."""
+        self.browser = browser
+        context = await browser.new_context()
+        self.page = await context.new_page()
+        self.page.set_default_timeout(DEFAULT_TIMEOUT_MS)
+        self.page.set_default_navigation_timeout(NAVIGATION_TIMEOUT_MS)
+
+    async def stop_browser(self):
+        """Close this agent's browser context; the browser stays running."""
+        if self.page:
+            await self.page.context.close()
+            self.page = None
+
+    async def get_axtree(self) -> List[Dict[str, Any]]:
+        """Get a compact snapshot of the page's visible interactive elements."""
+        rows = await self.page.evaluate(_AXTREE_JS, AXTREE_LIMIT)
+        return [{"ref": ref, "role": role, "name": name} for ref, role, name in rows]
+
+    async def get_page_info(self) -> Dict[str, Any]:
+        """Get current page information."""
+        if not self.page:
+            return {"error": "Browser not started"}
+
+        try:
+            info = {
+                "url": self.page.url,
+                "title": await self.page.title(),
+                # Truncate inside the browser so the full HTML is never transferred
+                "content": await self.page.evaluate(_PAGE_TEXT_JS),
+                "elements": await self.get_axtree()
+            }
+            main = self.page.locator("main")
+            if await main.count():
+                try:
+                    info["main_text"] = (await main.first.inner_text(timeout=500))[:PAGE_TEXT_LIMIT]
+                except Exception:
+                    pass
+            return info
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _do_navigate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        url = params["url"]
+        await self.page.goto(url)
+        return {"success": True, "result": f"Navigated to {url}"}
+
+    async def _do_click(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        try:
+            await self.page.click(selector, timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": f"Clicked on {selector}"}
+
+    async def _do_type(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        text = params.get("text", "")
+        try:
+            await self.page.fill(selector, text, timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": f"Typed '{text}' into {selector}"}
+
+    async def _do_get_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        selector = params["selector"]
+        try:
+            text = await self.page.locator(selector).first.text_content(timeout=ACTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return _selector_timeout(selector)
+        return {"success": True, "result": text}
+
+    async def _do_screenshot(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if not params.get("path"):
+            return self.store_screenshot(await self.page.screenshot(**_SCREENSHOT_OPTIONS))
+
+        path = _screenshot_path(params["path"])
+        await self.page.screenshot(path=path, **_SCREENSHOT_OPTIONS)
+        return {"success": True, "result": f"Screenshot saved to {path}"}
+
+    async def _do_snapshot(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        info = await self.get_page_info()
+        if "error" in info:
+            return {"success": False, "error": info["error"]}
+        return {"success": True, "result": info}
+
+    async def _do_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        results = []
+        for item in params["actions"]:
+            if not isinstance(item, dict):
+                results.append({"success": False, "error": "Batch items must be JSON objects"})
+            elif item.get("name") == "batch":
+                results.append({"success": False, "error": "Batch actions cannot be nested"})
+            else:
+                results.append(await self.execute_action(item.get("name", ""), item.get("params", {})))
+        return {"success": all(r["success"] for r in results), "results": results}
+
+    # Same actions and required parameters as BrowserAgent, with async handlers
+    _HANDLERS = {
+        "navigate": (_do_navigate, {"url"}),
+        "click": (_do_click, {"selector"}),
+        "type": (_do_type, {"selector"}),
+        "get_text": (_do_get_text, {"selector"}),
+        "screenshot": (_do_screenshot, set()),
+        "snapshot": (_do_snapshot, set()),
+        "batch": (_do_batch, {"actions"}),
+    }
+
+    async def execute_action(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute a browser action.
+
+        Supports the same actions and validation as BrowserAgent.execute_action.
+        """
+        if not self.page:
+            return {"success": False, "error": "Browser not started"}
+
+        params = self.resolve_ref(params)
+        error = self.check_action(action, params)
+        if error:
+            return {"success": False, "error": error}
+
+        handler, _ = self._HANDLERS[action]
+        try:
+            return await handler(self, params)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    async def get_llm_response(self, messages: List[Dict[str, str]],
+                               cache_totals: Dict[str, int]) -> str:
+        """
+        Get the assistant message for the given request messages.
+
+        Identical requests are answered from the exact-match cache; otherwise
+        the completion is streamed and closed once the action is complete.
+        """
+        key = _messages_key(messages)
+        cached = self.exact_cache_get(key)
+        if cached is not None:
+            return cached
+
+        # Stream the completion and stop reading as soon as the action is complete
+        stream = await self.client.chat.completions.create(
+            model=self.deployment,
+            messages=messages,
+            temperature=0.0,
+            seed=42,
+            max_tokens=self.budget_max_tokens(messages),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        # The first completion of each run is read to the end for its usage
+        sample_usage = not cache_totals["samples"]
+        cache_totals["samples"] += 1
+        scanner = ReactStreamScanner()
+        complete = False
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    self.log_cache_usage(chunk.usage, cache_totals)
+                if not complete and chunk.choices and chunk.choices[0].delta.content:
+                    complete = scanner.feed(chunk.choices[0].delta.content)
+                if complete and not sample_usage:
+                    break
+        finally:
+            await stream.close()
+
+        assistant_message = scanner.response
+        self.exact_cache_put(key, assistant_message)
+        return assistant_message
+
+    async def arun(self, task: str, browser: Browser) -> str:
+        """
+        Run the agent with a given task using ReAct-style loop.
+
+        Args:
+            task: The task description for the agent
+            browser: A launched Playwright browser to open the task's page on
+
+        Returns:
+            str: Final answer or error message
+        """
+        try:
+            await self.start_browser(browser)
+            messages = self.start_run(task, log_prefix=f"[{task[:30]}] ")
+
+            for iteration in range(self.max_iterations):
+                logger.info("\n[%s] --- Iteration %d ---", task[:30], iteration + 1)
+
+                # Get LLM response
+                assistant_message = await self.get_llm_response(
+                    self.build_request_messages(messages), self._cache_totals
+                )
+
+                step, execute = self.plan_step(messages, assistant_message)
+                if execute:
+                    result = await self.execute_action(step["action"], step["params"])
+                    self.record_result(messages, step, result)
+
+                answer = self.step_outcome(step)
+                if answer is not None:
+                    return answer
+
+            return "Maximum iterations reached without completion."
+
+        finally:
+            await self.stop_browser()
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    """Create a keep-alive HTTP client for the agents of one batch."""
+    # Pool limits and HTTP/2 are transport options when a transport is given
+    limits = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    try:
+        transport = httpx.AsyncHTTPTransport(http2=True, retries=2, limits=limits)
+    except ImportError:  # HTTP/2 needs the optional h2 package
+        transport = httpx.AsyncHTTPTransport(retries=2, limits=limits)
+    return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30.0, connect=5.0))
+
+
+async def run_batch(tasks: List[str], headless: bool = True) -> List[str]:
+    """
+    Run several tasks concurrently, each with its own agent and browser context.
+
+    All agents share one Chromium process and one pooled HTTP client; at most
+    MAX_PARALLEL_PAGES tasks run at the same time. A task that raises does not
+    cancel the others; its entry in the result is an error message instead.
+
+    Args:
+        tasks: The task descriptions to run
+        headless: Whether to run browser in headless mode
+
+    Returns:
+        list: Final answer or error message for each task, in input order
+    """
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_PAGES)
+
+    async with async_playwright() as playwright, _create_http_client() as http_client:
+        browser = await playwright.chromium.launch(headless=headless)
+
+        async def run_one(task: str) -> str:
+            async with semaphore:
+                return await AsyncBrowserAgent(http_client=http_client).arun(task, browser)
+
+        try:
+            results = await asyncio.gather(*[run_one(task) for task in tasks],
+                                           return_exceptions=True)
+        finally:
+            await browser.close()
+
+    return [
+        f"Error: {result}" if isinstance(result, BaseException) else result
+        for result in results
+    ]
+
+
+def main():
+    """Example usage of the async browser agent."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    tasks = [
+        "Navigate to https://www.example.com and get the main heading text",
+        "Navigate to https://www.iana.org and get the main heading text",
+    ]
+
+    results = asyncio.run(run_batch(tasks))
+
+    print("\n=== Final Results ===")
+    for task, result in zip(tasks, results):
+        print(f"{task}\n  -> {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,7 +24,9 @@ def demo_agent_structure():
         "click": "Click on an element using CSS selector",
         "type": "Type text into an input field",
         "get_text": "Extract text from an element",
-        "screenshot": "Take a screenshot of the page"
+        "screenshot": "Take a screenshot of the page",
+        "snapshot": "List interactive elements with refs usable as selectors",
+        "batch": "Run several independent actions in one step"
     }
     
     for action, description in actions.items():
@@ -77,7 +79,7 @@ def demo_agent_structure():
     print("-" * 70)
     print(f"   • Maximum iterations: 10 (configurable)")
     print(f"   • Browser mode: Headless or visible")
-    print(f"   • LLM temperature: 0.7 (balanced creativity)")
+    print(f"   • LLM temperature: 0 (deterministic, so responses can be cached)")
     print(f"   • Max tokens per response: 500")
     
     print("\n" + "=" * 70)
@@ -5,12 +5,14 @@ This script demonstrates how to use the BrowserAgent class with Azure OpenAI
 to automate browser interactions using natural language tasks.
 """
 
+import logging
 import sys
 from browser_agent import BrowserAgent
 
 
 def main():
     """Run the browser agent with a task."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     
     # Default task
     default_task = "Navigate to https://www.example.com and get the main heading text"
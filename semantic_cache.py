@@ -0,0 +1,123 @@
+"""
+Semantic cache for LLM responses.
+
+Responses are indexed by an embedding of the prompt that produced them, so a
+later prompt that is nearly identical (same task, same page state) can reuse
+the stored response instead of calling the LLM again. The index is persisted
+to disk so warm starts hit immediately.
+"""
+import json
+import os
+from typing import Any, List, Optional
+
+try:
+    import faiss
+    import numpy as np
+except ImportError:  # faiss and numpy are optional; the cache is disabled without them
+    faiss = None
+    np = None
+
+
+class SemanticCache:
+    """
+    A FAISS inner-product index over normalized embeddings (cosine similarity)
+    mapping prompts to previously returned LLM responses.
+    """
+
+    def __init__(self, client: Any, deployment: str, path: str = ".agent-cache",
+                 threshold: float = 0.97, max_entries: int = 1000, save_every: int = 20):
+        """
+        Initialize the cache, loading a persisted index from ``path`` if present.
+
+        Args:
+            client: An AzureOpenAI client used to compute embeddings
+            deployment: The embedding model deployment name
+            path: Directory the index and responses are persisted in
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum number of stored responses; the oldest are
+                evicted first
+            save_every: Number of added responses after which the cache is
+                written to disk; call flush() to write the rest
+        """
+        self.client = client
+        self.deployment = deployment
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.index = None
+        self.responses: List[str] = []
+        self._unsaved = 0
+
+        index_path = os.path.join(path, "index.faiss")
+        responses_path = os.path.join(path, "responses.json")
+        if os.path.exists(index_path) and os.path.exists(responses_path):
+            self.index = faiss.read_index(index_path)
+            with open(responses_path, encoding="utf-8") as f:
+                self.responses = json.load(f)
+
+    @classmethod
+    def from_env(cls, client: Any) -> Optional["SemanticCache"]:
+        """
+        Create a cache from environment variables.
+
+        Returns None (cache disabled) unless ``AZURE_OPENAI_EMBEDDING_DEPLOYMENT``
+        is set and faiss/numpy are installed.
+        """
+        deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+        if not deployment or faiss is None:
+            return None
+        return cls(client, deployment, path=os.getenv("AGENT_CACHE_DIR", ".agent-cache"))
+
+    def embed(self, text: str) -> Any:
+        """Embed ``text`` as a normalized float32 row vector."""
+        response = self.client.embeddings.create(model=self.deployment, input=text)
+        vector = np.array([response.data[0].embedding], dtype="float32")
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, vector: Any) -> Optional[str]:
+        """Return the cached response closest to ``vector`` if it is similar enough."""
+        if self.index is None or self.index.ntotal == 0:
+            return None
+
+        scores, ids = self.index.search(vector, 1)
+        if ids[0][0] >= 0 and scores[0][0] >= self.threshold:
+            return self.responses[ids[0][0]]
+        return None
+
+    def add(self, vector: Any, response: str):
+        """
+        Store ``response`` under ``vector``.
+
+        Rewriting the index is too slow to do on every miss, so the cache is
+        only persisted once ``save_every`` responses have been added.
+        """
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(vector.shape[1])
+        self.index.add(vector)
+        self.responses.append(response)
+
+        excess = len(self.responses) - self.max_entries
+        if excess > 0:
+            # Flat index ids are positions, so removing the first ids keeps
+            # them aligned with self.responses
+            self.index.remove_ids(np.arange(excess, dtype="int64"))
+            del self.responses[:excess]
+
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def flush(self):
+        """Write the cache to disk if responses were added since the last save."""
+        if self._unsaved:
+            self.save()
+
+    def save(self):
+        """Write the index and responses to disk."""
+        os.makedirs(self.path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(self.path, "index.faiss"))
+        with open(os.path.join(self.path, "responses.json"), "w", encoding="utf-8") as f:
+            json.dump(self.responses, f)
+        self._unsaved = 0
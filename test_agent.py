@@ -58,6 +58,30 @@ Action Input: {"selector": "button#submit"}"""
         assert params.get("selector") == "button#submit", f"Expected selector, got {params}"
         print("✓ Click action parsing works")
         
+        # Test case 4: Multi-line, nested Action Input
+        response4 = """Thought: Fill in the form
+Action: type
+Action Input: {
+  "selector": "input[name='q']",
+  "text": "braces { } inside"
+}"""
+        
+        thought, action, params = agent.parse_llm_response(response4)
+        assert thought == "Fill in the form", f"Expected thought, got '{thought}'"
+        assert action == "type", f"Expected 'type', got '{action}'"
+        assert params == {"selector": "input[name='q']", "text": "braces { } inside"}, f"Got {params}"
+        print("✓ Multi-line action input parsing works")
+        
+        # Test case 5: Action Input object on the next line, or in a code fence
+        for response5 in (
+            'Thought: Open it\nAction: navigate\nAction Input:\n{"url": "x"}',
+            'Thought: Open it\nAction: navigate\nAction Input:\n```json\n{"url": "x"}\n```',
+        ):
+            thought, action, params = agent.parse_llm_response(response5)
+            assert action == "navigate", f"Expected 'navigate', got '{action}'"
+            assert params == {"url": "x"}, f"Got {params} for {response5!r}"
+        print("✓ Next-line and fenced action input parsing works")
+        
         return True
         
     except Exception as e:
@@ -67,6 +91,28 @@ Action Input: {"selector": "button#submit"}"""
         return False
 
 
+def test_slots():
+    """Test that the agent and scanner classes have no per-instance __dict__."""
+    print("\nTesting __slots__...")
+    
+    try:
+        from browser_agent import BrowserAgent, ReactStreamScanner
+        from browser_agent_async import AsyncBrowserAgent
+        
+        for cls in (BrowserAgent, AsyncBrowserAgent, ReactStreamScanner):
+            instance = cls.__new__(cls)  # Create without __init__
+            assert not hasattr(instance, "__dict__"), f"{cls.__name__} should use __slots__"
+        print("✓ Classes use __slots__")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ __slots__ test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def test_browser_actions():
     """Test browser action execution with mocked Playwright."""
     print("\nTesting browser actions...")
@@ -89,7 +135,7 @@ def test_browser_actions():
                 mock_page.url = "https://example.com"
                 mock_page.title.return_value = "Example Domain"
                 mock_page.content.return_value = "<html><body>Test</body></html>"
-                mock_page.text_content.return_value = "Example Domain"
+                mock_page.locator.return_value.first.text_content.return_value = "Example Domain"
                 
                 agent.page = mock_page
                 
@@ -102,21 +148,81 @@ def test_browser_actions():
                 # Test click action
                 result = agent.execute_action("click", {"selector": "button"})
                 assert result["success"], "Click should succeed"
-                mock_page.click.assert_called_once_with("button")
+                mock_page.click.assert_called_once_with("button", timeout=2000)
                 print("✓ Click action works")
                 
                 # Test type action
                 result = agent.execute_action("type", {"selector": "input", "text": "test"})
                 assert result["success"], "Type should succeed"
-                mock_page.fill.assert_called_once_with("input", "test")
+                mock_page.fill.assert_called_once_with("input", "test", timeout=2000)
                 print("✓ Type action works")
                 
                 # Test get_text action
                 result = agent.execute_action("get_text", {"selector": "h1"})
                 assert result["success"], "Get text should succeed"
                 assert result["result"] == "Example Domain"
+                mock_page.locator.assert_called_with("h1")
                 print("✓ Get text action works")
                 
+                # Test missing elements fail after the bounded timeout
+                from browser_agent import PlaywrightTimeoutError
+                mock_page.locator.return_value.first.text_content.side_effect = PlaywrightTimeoutError("timeout")
+                result = agent.execute_action("get_text", {"selector": "h2"})
+                assert result == {"success": False, "error": "selector not found within 2s: h2"}, result
+                mock_page.locator.return_value.first.text_content.side_effect = None
+                print("✓ Selector timeout handling works")
+                
+                # Test in-memory screenshots are deduplicated by hash
+                mock_page.screenshot.return_value = b"jpeg bytes"
+                first = agent.execute_action("screenshot", {})
+                second = agent.execute_action("screenshot", {})
+                assert first["success"] and first["result"] == second["result"], "Identical screens should share a hash"
+                assert agent.get_screenshot(first["result"]) == b"jpeg bytes"
+                mock_page.screenshot.assert_called_with(type="jpeg", quality=80, full_page=False)
+                print("✓ Screenshot action works")
+                
+                # In-memory screenshots are dropped when the next run starts
+                agent.start_run("next task")
+                assert agent.get_screenshot(first["result"]) is None
+                print("✓ Screenshots are reset per run")
+                
+                # Test batch action
+                result = agent.execute_action("batch", {"actions": [
+                    {"name": "get_text", "params": {"selector": "h1"}},
+                    {"name": "batch", "params": {"actions": []}},
+                ]})
+                assert not result["success"], "Batch with a failed sub-action should fail"
+                assert result["results"][0] == {"success": True, "result": "Example Domain"}
+                assert not result["results"][1]["success"], "Nested batch should be rejected"
+                print("✓ Batch action works")
+                
+                # Test page info is truncated in the browser and lists elements
+                mock_page.evaluate.side_effect = ["Example Domain", [[1, "link", "More information..."]]]
+                mock_page.locator.return_value.count.return_value = 0
+                info = agent.get_page_info()
+                assert info == {"url": "https://example.com", "title": "Example Domain",
+                                "content": "Example Domain",
+                                "elements": [{"ref": 1, "role": "link", "name": "More information..."}]}, \
+                    f"Got {info}"
+                mock_page.content.assert_not_called()
+                mock_page.evaluate.side_effect = None
+                print("✓ Page info works")
+                
+                # Test element refs resolve to stamped selectors
+                result = agent.execute_action("click", {"ref": 1})
+                assert result["success"], "Click by ref should succeed"
+                mock_page.click.assert_called_with('[data-agent-ref="1"]', timeout=2000)
+                print("✓ Element refs work")
+                
+                # Test malformed params fail fast without calling Playwright
+                result = agent.execute_action("click", {"selector": ""})
+                assert not result["success"], "Empty selector should fail"
+                assert "selector" in result["error"]
+                assert mock_page.click.call_count == 2, "Only the earlier clicks should run"
+                result = agent.execute_action("navigate", ["https://example.com"])
+                assert not result["success"], "Non-object params should fail"
+                print("✓ Parameter validation works")
+                
                 # Test unknown action
                 result = agent.execute_action("unknown", {})
                 assert not result["success"], "Unknown action should fail"
@@ -131,6 +237,123 @@ def test_browser_actions():
         return False
 
 
+def test_axtree_snapshot():
+    """Test the element snapshot script against a fixture page in Chromium."""
+    print("\nTesting element snapshot...")
+    
+    try:
+        from playwright.sync_api import sync_playwright
+        from browser_agent import _AXTREE_JS
+        
+        fixture = """
+            <button>Go</button>
+            <a href="/docs">Docs</a>
+            <div role="region">Region</div>
+            <div role="presentation">Decor</div>
+            <div role="button">Div button</div>
+            <span tabindex="-1">Skipped</span>
+            <span tabindex="0">Focusable</span>
+            <input type="hidden" value="secret">
+            <button style="display: none">Hidden</button>
+        """
+        
+        with sync_playwright() as playwright:
+            try:
+                browser = playwright.chromium.launch()
+            except Exception as e:
+                print(f"- Chromium not available, skipping ({str(e).splitlines()[0]})")
+                return True
+            
+            try:
+                page = browser.new_page()
+                page.set_content(fixture)
+                rows = page.evaluate(_AXTREE_JS, 100)
+                assert [(role, name) for _, role, name in rows] == [
+                    ("button", "Go"), ("link", "Docs"), ("button", "Div button"), ("span", "Focusable")
+                ], f"Got {rows}"
+                print("✓ Only interactive and focusable elements get a ref")
+                
+                # Refs are stamped on the elements and stay stable across snapshots
+                assert page.evaluate(_AXTREE_JS, 100) == rows
+                assert page.inner_text('[data-agent-ref="%d"]' % rows[2][0]) == "Div button"
+                print("✓ Refs are stable and selectable")
+            finally:
+                browser.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Element snapshot test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_shared_browser():
+    """Test that runs reuse the shared browser and only close their own context."""
+    print("\nTesting shared browser...")
+    
+    try:
+        import threading
+        import browser_agent
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'), \
+                    patch('browser_agent.sync_playwright') as mock_sync_playwright, \
+                    patch.object(browser_agent, '_playwright', None), \
+                    patch.object(browser_agent, '_playwright_thread', None), \
+                    patch.object(browser_agent, '_browsers', {}), \
+                    patch.object(BrowserAgent, 'get_llm_response', return_value="Final Answer: done"):
+                launch = mock_sync_playwright.return_value.start.return_value.chromium.launch
+                browser = launch.return_value
+                browser.is_connected.return_value = True
+                
+                agent = BrowserAgent()
+                assert agent.run("first", headless=True) == "done"
+                assert agent.run("second", headless=True) == "done"
+                assert launch.call_count == 1, f"Expected 1 launch, got {launch.call_count}"
+                assert browser.new_context.call_count == 2, "Each run needs a fresh context"
+                print("✓ Second run reuses the shared browser")
+                
+                page = browser.new_context.return_value.new_page.return_value
+                assert page.context.close.call_count == 2, "Each run closes its context"
+                browser.close.assert_not_called()
+                assert agent.page is None
+                page.set_default_navigation_timeout.assert_called_with(30000)
+                print("✓ stop_browser closes only the context")
+                
+                errors = []
+                def use_from_thread():
+                    try:
+                        browser_agent._get_browser(headless=True)
+                    except RuntimeError as e:
+                        errors.append(e)
+                thread = threading.Thread(target=use_from_thread)
+                thread.start()
+                thread.join()
+                assert errors, "Using the shared browser from another thread should fail"
+                print("✓ Shared browser is bound to its thread")
+                
+                # Shutdown tolerates a driver that is already gone
+                browser_agent._playwright.stop.side_effect = RuntimeError("driver gone")
+                browser_agent._close_browsers()
+                assert browser_agent._playwright is None and not browser_agent._browsers
+                print("✓ Shared browser shutdown is guarded")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Shared browser test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def test_system_prompt():
     """Test that system prompt is generated correctly."""
     print("\nTesting system prompt generation...")
@@ -166,6 +389,544 @@ def test_system_prompt():
         return False
 
 
+def test_cache_usage_logging():
+    """Test prompt cache hit-rate accounting and that the prefix is cacheable."""
+    print("\nTesting prompt cache usage logging...")
+    
+    try:
+        import browser_agent
+        from browser_agent import BrowserAgent
+        
+        # Azure OpenAI only caches prompt prefixes of at least 1024 tokens
+        assert browser_agent._SYSTEM_PROMPT_TOKENS >= 1024, \
+            f"System prompt is only {browser_agent._SYSTEM_PROMPT_TOKENS} tokens"
+        print("✓ System prompt is long enough to be cached")
+        
+        agent = BrowserAgent.__new__(BrowserAgent)  # Create without __init__
+        totals = {"prompt_tokens": 0, "cached_tokens": 0, "samples": 0}
+        with patch.object(browser_agent, "logger") as mock_logger:
+            agent.log_cache_usage(Mock(prompt_tokens=2000, prompt_tokens_details=None), totals)
+            agent.log_cache_usage(
+                Mock(prompt_tokens=2000, prompt_tokens_details=Mock(cached_tokens=1536)), totals
+            )
+            assert totals == {"prompt_tokens": 4000, "cached_tokens": 1536, "samples": 0}, totals
+            args = mock_logger.info.call_args.args
+            assert args[1:3] == (1536, 2000) and abs(args[3] - 38.4) < 1e-9, f"Got {args}"
+            
+            # Usage without integer counts is ignored
+            agent.log_cache_usage(Mock(prompt_tokens=None), totals)
+            assert totals["prompt_tokens"] == 4000
+            assert mock_logger.info.call_count == 2
+        print("✓ Cache hit rate is accumulated over the run")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Cache usage logging test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_message_window():
+    """Test that old turns are collapsed into a summary message."""
+    print("\nTesting message window...")
+    
+    try:
+        from browser_agent import BrowserAgent
+        
+        agent = BrowserAgent.__new__(BrowserAgent)  # Create without __init__
+        agent.window = 4
+        agent.history = [
+            {"thought": "open", "action": "navigate", "params": {},
+             "result": {"success": True, "result": "Navigated to https://example.com"}},
+            {"thought": "read", "action": "get_text", "params": {},
+             "result": {"success": False, "error": "Timeout"}},
+            {"thought": "read", "action": "get_text", "params": {},
+             "result": {"success": True, "result": "Example Domain"}},
+        ]
+        
+        messages = [
+            {"role": "system", "content": "system"},
+            {"role": "user", "content": "Task: test"},
+        ]
+        for i in range(3):
+            messages.append({"role": "assistant", "content": f"assistant {i}"})
+            messages.append({"role": "user", "content": f"Observation {i}"})
+        
+        # Short conversations are sent unchanged
+        assert agent.build_request_messages(messages[:6]) == messages[:6]
+        
+        payload = agent.build_request_messages(messages)
+        assert payload[:2] == messages[:2], "Static prefix must be kept"
+        assert payload[-4:] == messages[-4:], "Most recent turns must be kept"
+        assert len(payload) == 7, f"Expected 7 messages, got {len(payload)}"
+        assert payload[2]["role"] == "user"
+        assert payload[2]["content"].startswith("Prior steps summary:")
+        assert "Navigated to https://example.com" in payload[2]["content"]
+        assert "open" not in payload[2]["content"], "Thoughts should be dropped"
+        print("✓ Message window works")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Message window test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_async_agent():
+    """Test the async agent's actions and batch runner with mocked Playwright."""
+    print("\nTesting async agent...")
+    
+    try:
+        import asyncio
+        from unittest.mock import AsyncMock
+        import browser_agent_async
+        from browser_agent_async import AsyncBrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent_async.AsyncAzureOpenAI'):
+                agent = AsyncBrowserAgent()
+                
+                mock_page = AsyncMock()
+                mock_page.locator = Mock()  # locator() is not a coroutine
+                mock_page.locator.return_value.first.text_content = AsyncMock(return_value="Example Domain")
+                agent.page = mock_page
+                
+                result = asyncio.run(agent.execute_action("navigate", {"url": "https://example.com"}))
+                assert result["success"], "Navigate should succeed"
+                mock_page.goto.assert_awaited_once_with("https://example.com")
+                
+                result = asyncio.run(agent.execute_action("get_text", {"selector": "h1"}))
+                assert result["result"] == "Example Domain"
+                print("✓ Async actions work")
+                
+                # The sync loop is not inherited; arun() shares its step logic
+                assert not hasattr(AsyncBrowserAgent, "run"), "Sync run() must not be inherited"
+                with patch.object(AsyncBrowserAgent, 'start_browser', AsyncMock()), \
+                        patch.object(AsyncBrowserAgent, 'stop_browser', AsyncMock()) as stop, \
+                        patch.object(AsyncBrowserAgent, 'execute_action', AsyncMock(
+                            return_value={"success": True, "result": "Clicked"})) as execute, \
+                        patch.object(AsyncBrowserAgent, 'get_llm_response', AsyncMock(return_value=(
+                            'Thought: click it\nAction: click\nAction Input: {"selector": "a"}'
+                        ))):
+                    result = asyncio.run(agent.arun("Click the link", Mock()))
+                    assert execute.await_count == 1, f"Expected 1 execution, got {execute.await_count}"
+                    assert agent.history[-1]["result"] == {"success": False, "error": "repeated action skipped"}
+                    assert result.startswith("Stopped after 3"), f"Got '{result}'"
+                    stop.assert_awaited_once()
+                print("✓ Async run loop works")
+            
+            # Each task gets its own agent; results come back in input order,
+            # and a failing task is reported without cancelling the others
+            async def fake_arun(self, task, browser):
+                await asyncio.sleep(0)
+                if task == "b":
+                    raise RuntimeError("page crashed")
+                return f"done: {task}"
+            
+            with patch('browser_agent_async.async_playwright') as mock_playwright, \
+                    patch('browser_agent_async.AsyncAzureOpenAI'), \
+                    patch.object(AsyncBrowserAgent, 'arun', fake_arun):
+                mock_playwright.return_value.__aenter__.return_value = AsyncMock()
+                results = asyncio.run(browser_agent_async.run_batch(["a", "b", "c", "d"]))
+                assert results == ["done: a", "Error: page crashed", "done: c", "done: d"], results
+                print("✓ Batch runner works")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Async agent test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_exact_cache():
+    """Test that identical requests are answered without a second LLM call."""
+    print("\nTesting exact-match cache...")
+    
+    try:
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'):
+                agent = BrowserAgent()
+                agent._cache = None
+                
+                create = agent.client.chat.completions.create
+                chunk = Mock(usage=None, choices=[Mock()])
+                chunk.choices[0].delta.content = "Final Answer: done"
+                create.return_value = MagicMock()
+                create.return_value.__iter__.return_value = iter([chunk])
+                
+                messages = [{"role": "user", "content": "Task: test"}]
+                totals = {"prompt_tokens": 0, "cached_tokens": 0, "samples": 0}
+                assert agent.get_llm_response(messages, totals) == "Final Answer: done"
+                assert agent.get_llm_response(list(messages), totals) == "Final Answer: done"
+                assert create.call_count == 1, f"Expected 1 LLM call, got {create.call_count}"
+                assert create.call_args.kwargs["temperature"] == 0.0
+                assert 0 < create.call_args.kwargs["max_tokens"] <= 500
+                print("✓ Exact-match cache works")
+                
+                # The cache is bounded and evicts the least recently used response
+                with patch('browser_agent.EXACT_CACHE_SIZE', 2):
+                    agent._exact_cache.clear()
+                    agent.exact_cache_put("a", "A")
+                    agent.exact_cache_put("b", "B")
+                    assert agent.exact_cache_get("a") == "A"
+                    agent.exact_cache_put("c", "C")
+                    assert list(agent._exact_cache) == ["a", "c"], list(agent._exact_cache)
+                print("✓ Exact-match cache is bounded")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Exact-match cache test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_shared_http_client():
+    """Test that all agents share one pooled HTTP client."""
+    print("\nTesting shared HTTP client...")
+    
+    try:
+        import browser_agent
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI') as mock_openai:
+                BrowserAgent()
+                shared_client = mock_openai.call_args.kwargs["http_client"]
+                assert shared_client is browser_agent._get_http_client()
+                BrowserAgent()
+                assert mock_openai.call_args.kwargs["http_client"] is shared_client
+                print("✓ Agents share one HTTP client")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Shared HTTP client test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_token_budget():
+    """Test that max_tokens is budgeted against the precomputed system prompt size."""
+    print("\nTesting token budget...")
+    
+    try:
+        import browser_agent
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'):
+                agent = BrowserAgent()
+                
+                messages = [{"role": "system", "content": "ignored"}]
+                assert agent.budget_max_tokens(messages) == browser_agent.MAX_RESPONSE_TOKENS
+                
+                # The completion budget shrinks as the context window fills up
+                with patch.object(browser_agent, "CONTEXT_WINDOW", browser_agent._SYSTEM_PROMPT_TOKENS + 300):
+                    budget = agent.budget_max_tokens(messages)
+                    assert budget == 250, f"Expected 250, got {budget}"
+                print("✓ Token budgeting works")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Token budget test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_usage_sampling():
+    """Test that the first completion of a run is read to the end for its usage."""
+    print("\nTesting usage sampling...")
+    
+    try:
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'):
+                agent = BrowserAgent()
+                agent._cache = None
+                
+                def chunk(content=None, usage=None):
+                    item = Mock(usage=usage, choices=[Mock()] if content else [])
+                    if content:
+                        item.choices[0].delta.content = content
+                    return item
+                
+                usage = Mock(prompt_tokens=1200, prompt_tokens_details=Mock(cached_tokens=1024))
+                create = agent.client.chat.completions.create
+                create.return_value = MagicMock()
+                create.return_value.__iter__.side_effect = lambda: iter([
+                    chunk("Final Answer: done\n"), chunk("Observation: extra"), chunk(usage=usage)
+                ])
+                
+                agent.start_run("test")
+                totals = agent._cache_totals
+                first = agent.get_llm_response([{"role": "user", "content": "Task: a"}], totals)
+                assert first == "Final Answer: done", f"Got {first!r}"
+                assert totals["prompt_tokens"] == 1200 and totals["cached_tokens"] == 1024, totals
+                print("✓ First completion is read to the end for its usage")
+                
+                agent.get_llm_response([{"role": "user", "content": "Task: b"}], totals)
+                assert totals["prompt_tokens"] == 1200, "Later completions should stop early"
+                print("✓ Later completions stop at the end of the action")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Usage sampling test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_repeated_actions():
+    """Test that repeated actions are skipped and a stalled run stops early."""
+    print("\nTesting repeated action handling...")
+    
+    try:
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'), \
+                    patch.object(BrowserAgent, 'start_browser'), \
+                    patch.object(BrowserAgent, 'stop_browser'), \
+                    patch.object(BrowserAgent, 'execute_action',
+                                 return_value={"success": True, "result": "Clicked"}) as execute, \
+                    patch.object(BrowserAgent, 'get_llm_response', return_value=(
+                        'Thought: click it\nAction: click\nAction Input: {"selector": "a"}'
+                    )):
+                agent = BrowserAgent()
+                result = agent.run("Click the link")
+                
+                assert execute.call_count == 1, f"Expected 1 execution, got {execute.call_count}"
+                assert len(agent.history) == 4, f"Expected 4 iterations, got {len(agent.history)}"
+                skipped = {"success": False, "error": "repeated action skipped"}
+                assert [step["result"] for step in agent.history[1:]] == [skipped] * 3
+                assert agent.summarize_step(agent.history[1]) == "error: repeated action skipped"
+                assert result.startswith("Stopped after 3"), f"Got '{result}'"
+                print("✓ Repeated actions are skipped")
+                print("✓ Stalled runs stop early")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Repeated action test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_stream_scanner():
+    """Test that streamed responses are cut off once the action is complete."""
+    print("\nTesting stream scanner...")
+    
+    try:
+        from browser_agent import ReactStreamScanner
+        
+        scanner = ReactStreamScanner()
+        chunks = ["Thought: open the page\nAction: navi", "gate\nAction Input: {\"url\": ",
+                  "\"https://example.com/{x}\"", "}", "\nThought: more text"]
+        done = [scanner.feed(chunk) for chunk in chunks[:4]]
+        assert done == [False, False, False, True], f"Got {done}"
+        assert scanner.response.endswith('{"url": "https://example.com/{x}"}')
+        print("✓ Action Input completion works")
+        
+        scanner = ReactStreamScanner()
+        assert not scanner.feed("Final Answer: The heading")
+        assert scanner.feed(" is Example Domain\n")
+        assert scanner.response == "Final Answer: The heading is Example Domain"
+        print("✓ Final Answer completion works")
+        
+        # Text after the action in the same chunk is not part of the response
+        scanner = ReactStreamScanner()
+        assert scanner.feed('Action: navigate\nAction Input: {"url": "x"}\nObservation: fake\n')
+        assert scanner.response == 'Action: navigate\nAction Input: {"url": "x"}', repr(scanner.response)
+        scanner = ReactStreamScanner()
+        assert scanner.feed("Final Answer: done\nObservation: fake\n")
+        assert scanner.response == "Final Answer: done", repr(scanner.response)
+        print("✓ Trailing text is trimmed")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Stream scanner test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_semantic_cache():
+    """Test that similar prompts hit the semantic cache and survive a reload."""
+    print("\nTesting semantic cache...")
+    
+    try:
+        import tempfile
+        import semantic_cache
+        from semantic_cache import SemanticCache
+        
+        if semantic_cache.faiss is None:
+            print("- faiss not installed, skipping")
+            return True
+        
+        embeddings = {"same page": [1.0, 0.0, 0.0], "other page": [0.0, 1.0, 0.0],
+                      "third page": [0.0, 0.0, 1.0]}
+        client = Mock()
+        client.embeddings.create.side_effect = lambda model, input: Mock(
+            data=[Mock(embedding=embeddings[input])]
+        )
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = SemanticCache(client, "embedding-deployment", path=cache_dir)
+            vector = cache.embed("same page")
+            assert cache.lookup(vector) is None, "Empty cache should miss"
+            
+            cache.add(vector, "Action: navigate")
+            assert cache.lookup(cache.embed("same page")) == "Action: navigate"
+            assert cache.lookup(cache.embed("other page")) is None, "Dissimilar prompt should miss"
+            print("✓ Cache lookup works")
+            
+            # Writes are batched; flush() persists the pending responses
+            assert not os.listdir(cache_dir), "A single add should not rewrite the index"
+            cache.flush()
+            reloaded = SemanticCache(client, "embedding-deployment", path=cache_dir)
+            assert reloaded.lookup(reloaded.embed("same page")) == "Action: navigate"
+            print("✓ Cache persistence works")
+            
+            # The oldest responses are evicted beyond max_entries
+            bounded = SemanticCache(client, "embedding-deployment", path=cache_dir,
+                                    max_entries=2, save_every=2)
+            for text in ("other page", "third page"):
+                bounded.add(bounded.embed(text), f"Action: {text}")
+            assert bounded.index.ntotal == 2 and len(bounded.responses) == 2
+            assert bounded.lookup(bounded.embed("same page")) is None, "Oldest entry should be evicted"
+            assert bounded.lookup(bounded.embed("third page")) == "Action: third page"
+            assert SemanticCache(client, "embedding-deployment", path=cache_dir).responses == \
+                ["Action: other page", "Action: third page"], "Batch should be saved"
+            print("✓ Cache size is bounded")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Semantic cache test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_semantic_cache_key():
+    """Test that the semantic cache is keyed by the task, not the shared system prompt."""
+    print("\nTesting semantic cache key...")
+    
+    try:
+        from browser_agent import BrowserAgent
+        
+        with patch.dict(os.environ, {
+            'AZURE_OPENAI_API_KEY': 'test_key',
+            'AZURE_OPENAI_ENDPOINT': 'https://test.openai.azure.com/',
+            'AZURE_OPENAI_DEPLOYMENT': 'test-deployment'
+        }):
+            with patch('browser_agent.AzureOpenAI'):
+                agent = BrowserAgent()
+                
+                # A dict-backed stand-in that only hits on an identical embedded text
+                store = {}
+                agent._cache = Mock()
+                agent._cache.embed.side_effect = lambda text: text
+                agent._cache.lookup.side_effect = store.get
+                agent._cache.add.side_effect = store.__setitem__
+                
+                create = agent.client.chat.completions.create
+                chunk = Mock(usage=None, choices=[Mock()])
+                chunk.choices[0].delta.content = "Final Answer: done"
+                create.return_value = MagicMock()
+                create.return_value.__iter__.side_effect = lambda: iter([chunk])
+                
+                system = {"role": "system", "content": agent.create_system_prompt()}
+                totals = {"prompt_tokens": 0, "cached_tokens": 0, "samples": 0}
+                for task in ("Task: first", "Task: second"):
+                    agent.get_llm_response([system, {"role": "user", "content": task}], totals)
+                assert create.call_count == 2, f"Expected 2 LLM calls, got {create.call_count}"
+                assert sorted(store) == ["Task: first", "Task: second"], f"Got {sorted(store)}"
+                print("✓ Different tasks do not share a semantic cache entry")
+                
+                agent.get_llm_response([
+                    system,
+                    {"role": "user", "content": "Task: first"},
+                    {"role": "assistant", "content": "Action: snapshot"},
+                    {"role": "user", "content": "Observation: page"},
+                ], totals)
+                embedded = agent._cache.embed.call_args.args[0]
+                assert embedded == "Task: first\nAction: snapshot\nObservation: page", f"Got {embedded!r}"
+                print("✓ Task, last action and latest observation are embedded")
+                
+                # Steps with the same observation but different actions do not collide
+                from browser_agent import _semantic_cache_text
+                observation = {"role": "user", "content": 'Observation: {"success": true}'}
+                step3, step5 = (
+                    _semantic_cache_text([system, {"role": "user", "content": "Task: first"},
+                                          {"role": "assistant", "content": action}, observation])
+                    for action in ("Action: click", "Action: get_text")
+                )
+                assert step3 != step5, "The last action must be part of the key"
+                
+                # Cache failures fall through to the LLM instead of ending the run
+                for failing in ("embed", "lookup", "add"):
+                    store.clear()
+                    agent._exact_cache.clear()
+                    method = getattr(agent._cache, failing)
+                    side_effect, method.side_effect = method.side_effect, RuntimeError("cache down")
+                    calls = create.call_count
+                    response = agent.get_llm_response([system, {"role": "user", "content": "Task: x"}], totals)
+                    method.side_effect = side_effect
+                    assert response == "Final Answer: done", f"Got {response!r}"
+                    assert create.call_count == calls + 1, f"LLM not called when {failing} fails"
+                print("✓ Semantic cache failures are not fatal")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Semantic cache key test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def main():
     """Run all tests."""
     print("=" * 60)
@@ -175,8 +936,22 @@ def main():
     tests = [
         test_imports,
         test_action_parsing,
+        test_slots,
         test_browser_actions,
+        test_axtree_snapshot,
+        test_shared_browser,
         test_system_prompt,
+        test_cache_usage_logging,
+        test_message_window,
+        test_async_agent,
+        test_exact_cache,
+        test_shared_http_client,
+        test_token_budget,
+        test_usage_sampling,
+        test_repeated_actions,
+        test_stream_scanner,
+        test_semantic_cache,
+        test_semantic_cache_key,
     ]
     
     passed = 0